@@ -46,6 +46,15 @@ flags.DEFINE_integer('unroll_length', 100, 'Unroll length in agent steps.')
 flags.DEFINE_integer('num_training_tpus', 1, 'Number of TPUs for training.')
 flags.DEFINE_string('init_checkpoint', None,
                     'Path to the checkpoint used to initialize the agent.')
+flags.DEFINE_bool('use_xla', False,
+                  'Whether to compile the loss and gradient computation with '
+                  'XLA. This is already the case on TPUs; use it to enable '
+                  'XLA on GPUs.')
+flags.DEFINE_bool('mixed_bfloat16', False,
+                  'Whether to run the agent with the mixed_bfloat16 Keras '
+                  'policy (bfloat16 activations, float32 variables). The loss '
+                  'is still computed in float32. The agent must keep its '
+                  'outputs and its recurrent state in float32.')
 
 # Loss settings.
 flags.DEFINE_float('entropy_cost', 0.00025, 'Entropy cost/multiplier.')
@@ -72,6 +81,26 @@ FLAGS = flags.FLAGS
 
 def compute_loss(logger, parametric_action_distribution, agent, agent_state,
                  prev_actions, env_outputs, agent_outputs):
+  """Computes the V-trace loss on a time-major batch of unrolls.
+
+  This is only meant to be called while tracing the learner's `minimize`
+  tf.function, which happens once. The Python conditions on flags and on the
+  distribution type below are therefore resolved at trace time and don't leave
+  any branch in the resulting graph.
+
+  Args:
+    logger: utils.ProgressLogger used to log loss statistics.
+    parametric_action_distribution: Distribution over the agent's actions.
+    agent: The agent being trained.
+    agent_state: Agent state at the beginning of the unrolls.
+    prev_actions: [T+1, B] tensor of previous (postprocessed) actions.
+    env_outputs: utils.EnvOutput structure of [T+1, B] tensors.
+    agent_outputs: Structure of [T+1, B] tensors returned by the agent during
+      inference.
+
+  Returns:
+    A pair (total_loss, logging session).
+  """
   # Networks expect postprocessed prev_actions but it's done during inference.
   # agent((prev_actions[t], env_outputs[t]), agent_state)
   #   -> agent_outputs[t], agent_state'
@@ -82,29 +111,42 @@ def compute_loss(logger, parametric_action_distribution, agent, agent_state,
                              is_training=True,
                              postprocess_action=False)
 
+  # V-trace and the losses are computed in float32, even if the agent runs its
+  # forward pass in reduced precision.
+  learner_outputs = learner_outputs._replace(
+      policy_logits=tf.cast(learner_outputs.policy_logits, tf.float32),
+      baseline=tf.cast(learner_outputs.baseline, tf.float32))
+  agent_outputs = agent_outputs._replace(
+      policy_logits=tf.cast(agent_outputs.policy_logits, tf.float32))
+
   # Use last baseline value (from the value function) to bootstrap.
   bootstrap_value = learner_outputs.baseline[-1]
 
   # At this point, we have unroll length + 1 steps. The last step is only used
   # as bootstrap value, so it's removed.
-  agent_outputs = tf.nest.map_structure(lambda t: t[:-1], agent_outputs)
-  rewards, done, _, _, _ = tf.nest.map_structure(lambda t: t[1:], env_outputs)
-  learner_outputs = tf.nest.map_structure(lambda t: t[:-1], learner_outputs)
+  # Only the rewards and done flags are needed from the shifted env outputs.
+  agent_outputs, learner_outputs = tf.nest.map_structure(
+      lambda t: t[:-1], (agent_outputs, learner_outputs))
+  rewards = env_outputs.reward[1:]
+  done = env_outputs.done[1:]
 
   if FLAGS.max_abs_reward:
     rewards = tf.clip_by_value(rewards, -FLAGS.max_abs_reward,
                                FLAGS.max_abs_reward)
-  discounts = tf.cast(~done, tf.float32) * FLAGS.discounting
+  # Single select op (scalars are broadcast to the shape of done).
+  discounts = tf.where(done, 0., FLAGS.discounting)
+
+  target_action_log_probs, behaviour_action_log_probs = (
+      parametric_action_distribution.log_prob_pair(
+          learner_outputs.policy_logits, agent_outputs.policy_logits,
+          agent_outputs.action))
 
-  target_action_log_probs = parametric_action_distribution.log_prob(
-      learner_outputs.policy_logits, agent_outputs.action)
-  behaviour_action_log_probs = parametric_action_distribution.log_prob(
-      agent_outputs.policy_logits, agent_outputs.action)
+  # The log importance weights are shared between V-trace and the KL loss.
+  log_rhos = target_action_log_probs - behaviour_action_log_probs
 
   # Compute V-trace returns and weights.
-  vtrace_returns = vtrace.from_importance_weights(
-      target_action_log_probs=target_action_log_probs,
-      behaviour_action_log_probs=behaviour_action_log_probs,
+  vtrace_returns = vtrace.from_log_rhos(
+      log_rhos=log_rhos,
       discounts=discounts,
       rewards=rewards,
       values=learner_outputs.baseline,
@@ -120,12 +162,13 @@ def compute_loss(logger, parametric_action_distribution, agent, agent_state,
   v_loss = FLAGS.baseline_cost * 0.5 * tf.reduce_mean(tf.square(v_error))
 
   # Entropy reward
-  entropy = tf.reduce_mean(
-      parametric_action_distribution.entropy(learner_outputs.policy_logits))
+  entropy, dist = parametric_action_distribution.entropy_and_dist(
+      learner_outputs.policy_logits)
+  entropy = tf.reduce_mean(entropy)
   entropy_loss = tf.stop_gradient(agent.entropy_cost()) * -entropy
 
   # KL(old_policy|new_policy) loss
-  kl = behaviour_action_log_probs - target_action_log_probs
+  kl = -log_rhos
   kl_loss = FLAGS.kl_cost * tf.reduce_mean(kl)
 
   # Entropy cost adjustment (Langrange multiplier style)
@@ -150,8 +193,6 @@ def compute_loss(logger, parametric_action_distribution, agent, agent_state,
   logger.log(session, 'losses/kl', kl_loss)
   logger.log(session, 'losses/total', total_loss)
   # policy
-  dist = parametric_action_distribution.create_dist(
-      learner_outputs.policy_logits)
   if hasattr(dist, 'scale'):
     logger.log(session, 'policy/std', tf.reduce_mean(dist.scale))
   logger.log(session, 'policy/max_action_abs(before_tanh)',
@@ -209,8 +250,17 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
   agent_input_specs = (action_specs, env_output_specs)
 
   # Initialize agent and variables.
-  agent = create_agent_fn(env.action_space, env.observation_space,
-                          parametric_action_distribution)
+  # Keras layers read the global policy when they are created, so the
+  # mixed_bfloat16 policy is only set while creating the agent. Variables, and
+  # therefore gradients and optimizer slots, stay in float32.
+  previous_policy = tf.keras.mixed_precision.experimental.global_policy()
+  if FLAGS.mixed_bfloat16:
+    tf.keras.mixed_precision.experimental.set_policy('mixed_bfloat16')
+  try:
+    agent = create_agent_fn(env.action_space, env.observation_space,
+                            parametric_action_distribution)
+  finally:
+    tf.keras.mixed_precision.experimental.set_policy(previous_policy)
   initial_agent_state = agent.initial_state(1)
   agent_state_specs = tf.nest.map_structure(
       lambda t: tf.TensorSpec(t.shape[1:], t.dtype), initial_agent_state)
@@ -224,7 +274,17 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
     def create_variables(*args):
       return agent.get_action(*decode(args))
 
-    initial_agent_output, _ = create_variables(*input_, initial_agent_state)
+    initial_agent_output, agent_state = create_variables(
+        *input_, initial_agent_state)
+    # Agent states are stored in Aggregators built from the initial state, so
+    # agents must not change their dtype (e.g. to bfloat16 when using the
+    # mixed_bfloat16 policy).
+    for spec, state in zip(tf.nest.flatten(agent_state_specs),
+                           tf.nest.flatten(agent_state)):
+      if state.dtype != spec.dtype:
+        raise ValueError(
+            'The agent returned a state of dtype {} instead of {}.'.format(
+                state.dtype, spec.dtype))
 
     if not hasattr(agent, 'entropy_cost'):
       mul = FLAGS.entropy_cost_adjustment_speed
@@ -266,10 +326,14 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
         loss, logs = compute_loss(logger, parametric_action_distribution, agent,
                                   *args)
       grads = tape.gradient(loss, agent.trainable_variables)
-      for t, g in zip(temp_grads, grads):
-        t.assign(g)
+      # Runs at trace time only, creating one assign op per variable.
+      tf.nest.map_structure(lambda t, g: t.assign(g), temp_grads, grads)
       return loss, logs
 
+    if FLAGS.use_xla:
+      compute_gradients = tf.function(compute_gradients,
+                                      experimental_compile=True)
+
     loss, logs = training_strategy.run(compute_gradients, (data,))
     loss = training_strategy.experimental_local_results(loss)[0]
 
@@ -331,7 +395,7 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
       first_agent_states = utils.Aggregator(
           FLAGS.num_envs, agent_state_specs, 'first_agent_states')
 
-      # Current agent state and action.
+      # Current agent state and (postprocessed) action.
       agent_states = utils.Aggregator(
           FLAGS.num_envs, agent_state_specs, 'agent_states')
       actions = utils.Aggregator(FLAGS.num_envs, action_specs, 'actions')
@@ -344,30 +408,39 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
                              ts.dtype, ts.name)
 
       inference_specs = (
-          tf.TensorSpec([], tf.int32, 'env_id'),
-          tf.TensorSpec([], tf.int64, 'run_id'),
-          env_output_specs,
-          tf.TensorSpec([], tf.float32, 'raw_reward'),
+          tf.TensorSpec([utils.INFERENCE_HEADER_DTYPE.itemsize], tf.uint8,
+                        'header'),
+          env_output_specs.observation,
       )
       inference_specs = tf.nest.map_structure(add_batch_size, inference_specs)
       def create_inference_fn(inference_device):
         @tf.function(input_signature=inference_specs)
-        def inference(env_ids, run_ids, env_outputs, raw_rewards):
+        def inference(packed_headers, observations):
+          header = utils.unpack_inference_header(packed_headers)
+          env_ids = header['env_id']
+          run_ids = header['run_id']
+          raw_rewards = header['raw_reward']
+          env_outputs = utils.EnvOutput(header['reward'], header['done'],
+                                        observations, header['abandoned'],
+                                        header['episode_step'])
           # Reset the environments that had their first run or crashed.
           previous_run_ids = env_run_ids.read(env_ids)
           env_run_ids.replace(env_ids, run_ids)
-          reset_indices = tf.where(
-              tf.not_equal(previous_run_ids, run_ids))[:, 0]
-          envs_needing_reset = tf.gather(env_ids, reset_indices)
-          if tf.not_equal(tf.shape(envs_needing_reset)[0], 0):
+          needs_reset = tf.not_equal(previous_run_ids, run_ids)
+          # Resets are rare (first run or crash of an environment), so the
+          # dynamically-shaped reset ops are only run when they are needed.
+          if tf.reduce_any(needs_reset):
+            envs_needing_reset = tf.gather(env_ids,
+                                           tf.where(needs_reset)[:, 0])
             tf.print('Environment ids needing reset:', envs_needing_reset)
-          env_infos.reset(envs_needing_reset)
-          store.reset(envs_needing_reset)
-          initial_agent_states = agent.initial_state(
-              tf.shape(envs_needing_reset)[0])
-          first_agent_states.replace(envs_needing_reset, initial_agent_states)
-          agent_states.replace(envs_needing_reset, initial_agent_states)
-          actions.reset(envs_needing_reset)
+            env_infos.reset(envs_needing_reset)
+            store.reset(envs_needing_reset)
+            initial_agent_states = agent.initial_state(
+                tf.shape(envs_needing_reset)[0])
+            utils.Aggregator.replace_many(
+                [first_agent_states, agent_states], envs_needing_reset,
+                [initial_agent_states, initial_agent_states])
+            actions.reset(envs_needing_reset)
 
           tf.debugging.assert_non_positive(
               tf.cast(env_outputs.abandoned, tf.int32),
@@ -375,17 +448,17 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
 
           # Update steps and return.
           env_infos.add(env_ids, (0, env_outputs.reward, raw_rewards))
-          done_ids = tf.gather(env_ids, tf.where(env_outputs.done)[:, 0])
-          if i == 0:
-            info_queue.enqueue_many(env_infos.read(done_ids))
-          env_infos.reset(done_ids)
+          if tf.reduce_any(env_outputs.done):
+            done_ids = tf.gather(env_ids, tf.where(env_outputs.done)[:, 0])
+            if i == 0:
+              info_queue.enqueue_many(env_infos.read(done_ids))
+            env_infos.reset(done_ids)
           env_infos.add(env_ids, (FLAGS.num_action_repeats, 0., 0.))
 
           # Inference.
-          prev_actions = parametric_action_distribution.postprocess(
-              actions.read(env_ids))
-          input_ = encode((prev_actions, env_outputs))
+          prev_actions = actions.read(env_ids)
           prev_agent_states = agent_states.read(env_ids)
+          input_ = encode((prev_actions, env_outputs))
           with tf.device(inference_device):
             @tf.function
             def agent_inference(*args):
@@ -404,12 +477,16 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
           first_agent_states.replace(completed_ids,
                                      agent_states.read(completed_ids))
 
-          # Update current state.
-          agent_states.replace(env_ids, curr_agent_states)
-          actions.replace(env_ids, agent_outputs.action)
-          # Return environment actions to environments.
-          return parametric_action_distribution.postprocess(
+          # Update current state. Actions are stored postprocessed, as they are
+          # both returned to the environments and used as the next
+          # prev_actions.
+          postprocessed_actions = parametric_action_distribution.postprocess(
               agent_outputs.action)
+          utils.Aggregator.replace_many(
+              [agent_states, actions], env_ids,
+              [curr_agent_states, postprocessed_actions])
+          # Return environment actions to environments.
+          return postprocessed_actions
 
         return inference
 
@@ -423,15 +500,17 @@ def learner_loop(create_env_fn, create_agent_fn, create_optimizer_fn):
     create_host(i, host, inference_devices)
 
   def dequeue(ctx):
-    # Create batch (time major).
-    env_outputs = tf.nest.map_structure(lambda *args: tf.stack(args), *[
-        unroll_queues[ctx.input_pipeline_id].dequeue()
-        for i in range(ctx.get_per_replica_batch_size(FLAGS.batch_size))
-    ])
+    # Create batch (time major). A single dequeue_many produces the batch
+    # directly instead of dequeuing unrolls one by one and stacking them.
+    env_outputs = unroll_queues[ctx.input_pipeline_id].dequeue_many(
+        ctx.get_per_replica_batch_size(FLAGS.batch_size))
+    prev_actions, unroll_env_outputs, agent_outputs = utils.make_time_major(
+        (env_outputs.prev_actions, env_outputs.env_outputs,
+         env_outputs.agent_outputs))
     env_outputs = env_outputs._replace(
-        prev_actions=utils.make_time_major(env_outputs.prev_actions),
-        env_outputs=utils.make_time_major(env_outputs.env_outputs),
-        agent_outputs=utils.make_time_major(env_outputs.agent_outputs))
+        prev_actions=prev_actions,
+        env_outputs=unroll_env_outputs,
+        agent_outputs=agent_outputs)
     env_outputs = env_outputs._replace(
         env_outputs=encode(env_outputs.env_outputs))
     # tf.data.Dataset treats list leafs as tensors, so we need to flatten and
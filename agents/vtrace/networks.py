@@ -47,14 +47,17 @@ class MLPandLSTM(tf.Module):
     self._policy_logits = tf.keras.layers.Dense(
         parametric_action_distribution.param_size, name='policy_logits')
     self._baseline = tf.keras.layers.Dense(1, name='baseline')
+    self._compute_dtype = (
+        tf.keras.mixed_precision.experimental.global_policy().compute_dtype)
 
   @tf.function
   def initial_state(self, batch_size):
     return self._core.get_initial_state(batch_size=batch_size, dtype=tf.float32)
 
   def _head(self, core_output):
-    policy_logits = self._policy_logits(core_output)
-    baseline = tf.squeeze(self._baseline(core_output), axis=-1)
+    policy_logits = tf.cast(self._policy_logits(core_output), tf.float32)
+    baseline = tf.cast(
+        tf.squeeze(self._baseline(core_output), axis=-1), tf.float32)
 
     # Sample an action from the policy.
     action = self._parametric_action_distribution.sample(policy_logits)
@@ -112,8 +115,12 @@ class MLPandLSTM(tf.Module):
     unused_reward, done, observation, _, _ = env_outputs
     observation = self._mlp(observation)
 
+    # Keras layers only cast their first argument, so the core state is cast to
+    # the compute dtype here and back to float32 after the unroll.
+    core_state = tf.nest.map_structure(
+        lambda s: tf.cast(s, self._compute_dtype), core_state)
     initial_core_state = self._core.get_initial_state(
-        batch_size=tf.shape(observation)[1], dtype=tf.float32)
+        batch_size=tf.shape(observation)[1], dtype=self._compute_dtype)
     core_output_list = []
     for input_, d in zip(tf.unstack(observation), tf.unstack(done)):
       # If the episode ended, the core state should be reset before the next.
@@ -125,5 +132,7 @@ class MLPandLSTM(tf.Module):
       core_output, core_state = self._core(input_, core_state)
       core_output_list.append(core_output)
     outputs = tf.stack(core_output_list)
+    core_state = tf.nest.map_structure(lambda s: tf.cast(s, tf.float32),
+                                       core_state)
 
     return utils.batch_apply(self._head, (outputs,)), core_state
@@ -14,7 +14,10 @@
 
 r"""SEED actor."""
 
+import concurrent.futures
+import functools
 import os
+import time
 import timeit
 
 from absl import flags
@@ -37,11 +40,85 @@ flags.DEFINE_integer('num_actors_with_summaries', 4,
 flags.DEFINE_bool('render', False,
                   'Whether the first actor should render the environment.')
 
+# Number of finished episodes whose statistics are buffered before the actor
+# loop logs them, even if less than a second has passed since the last log.
+_EPISODE_REPORT_CAPACITY = 256
+
+# Bounds of the exponential backoff between reconnections to the learner.
+_MIN_RECONNECT_DELAY_S = 0.1
+_MAX_RECONNECT_DELAY_S = 30.
+
+# Generator for the run ids, created once and reused across reconnections.
+_RNG = np.random.default_rng()
+
 
 def are_summaries_enabled():
   return FLAGS.task < FLAGS.num_actors_with_summaries
 
 
+class _EnvBatch(object):
+  """A batched environment together with the inputs sent to the learner.
+
+  The inference inputs live in persistent buffers which are updated in place, so
+  the same structure is passed to the client at every step. The per-environment
+  scalars are views into a single packed header (see
+  utils.INFERENCE_HEADER_DTYPE), which is sent as one tensor.
+  """
+
+  def __init__(self, create_env_fn, batch_size, id_offset):
+    self.batch_size = batch_size
+    self.env = env_wrappers.BatchedEnvironment(create_env_fn, batch_size,
+                                               id_offset)
+    self.header = np.zeros(batch_size, utils.INFERENCE_HEADER_DTYPE)
+    self.header['env_id'] = self.env.env_ids
+    self.header['run_id'] = _RNG.integers(
+        np.iinfo(np.int64).max, size=batch_size, dtype=np.int64)
+    self.observation = tf.nest.map_structure(np.copy, self.env.reset())
+    self.reward = self.header['reward']
+    self.raw_reward = self.header['raw_reward']
+    self.done = self.header['done']
+    self.abandoned = self.header['abandoned']
+
+    self.episode_step = self.header['episode_step']
+    # Returns and raw returns of the current episodes, as two columns.
+    self.episode_returns = np.zeros((batch_size, 2), np.float32)
+    self.packed_header = utils.inference_header_bytes(self.header)
+
+  @property
+  def inference_args(self):
+    return self.packed_header, self.observation
+
+  def step(self, action):
+    """Steps the environments and updates the buffers and episode statistics.
+
+    The statistics are updated with a handful of in-place NumPy ops on the
+    buffers sent to the learner. A tf.function would cost more in eager dispatch
+    and host/tensor conversions than these ops take.
+
+    Args:
+      action: Actions for all environments of the batch, as a NumPy array.
+    """
+    _, score_reward, abandoned = self.env.step_into(
+        action, self.observation, self.reward, self.done)
+    np.copyto(self.raw_reward, score_reward)
+    # If the info dict contains an entry abandoned=True and the
+    # episode was ended (done=True), then we need to specially handle
+    # the final transition as per the explanations in actor_loop.
+    np.copyto(self.abandoned, abandoned)
+    self.episode_step += 1
+    self.episode_returns[:, 0] += self.reward
+    self.episode_returns[:, 1] += self.raw_reward
+    assert not np.any(self.abandoned & ~self.done)
+
+  def reset_if_done(self):
+    self.env.reset_if_done_into(self.done, self.observation)
+
+
+def _inference(client, *args):
+  """Runs an inference call and fetches the resulting actions as NumPy."""
+  return client.inference(*args).numpy()
+
+
 def actor_loop(create_env_fn):
   """Main actor loop.
 
@@ -53,128 +130,175 @@ def actor_loop(create_env_fn):
   logging.info('Starting actor loop. Task: %r. Environment batch size: %r',
                FLAGS.task, env_batch_size)
   is_rendering_enabled = FLAGS.render and FLAGS.task == 0
-  if are_summaries_enabled():
+  summaries_enabled = are_summaries_enabled()
+  if summaries_enabled:
     summary_writer = tf.summary.create_file_writer(
         os.path.join(FLAGS.logdir, 'actor_{}'.format(FLAGS.task)),
         flush_millis=20000, max_queue=1000)
-    timer_cls = profiling.ExportingTimer
+    timer_cls = functools.partial(profiling.ExportingTimer,
+                                  summary_writer=summary_writer)
   else:
     summary_writer = tf.summary.create_noop_writer()
     timer_cls = utils.nullcontext
 
+  # With double buffering, the environments are split in two batches: one batch
+  # is stepped while the inference for the other one is in flight.
+  num_env_batches = 2 if FLAGS.actor_double_buffering else 1
+  assert env_batch_size % num_env_batches == 0, (
+      'env_batch_size must be even with actor_double_buffering.')
+  inference_env_batch_size = env_batch_size // num_env_batches
+
   actor_step = 0
+  reconnect_delay_s = _MIN_RECONNECT_DELAY_S
   with summary_writer.as_default():
     while True:
+      env_batches = []
+      executor = None
+      actor_step_at_connect = actor_step
       try:
         # Client to communicate with the learner.
         client = grpc.Client(FLAGS.server_address)
+        if FLAGS.actor_double_buffering:
+          # Inference calls are made from a worker thread so they can overlap
+          # with the environment steps of the other batch. The client
+          # serializes the calls anyway.
+          executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
-        batched_env = env_wrappers.BatchedEnvironment(
-            create_env_fn, env_batch_size, FLAGS.task * env_batch_size)
-
-        env_id = batched_env.env_ids
-        run_id = np.random.randint(
-            low=0,
-            high=np.iinfo(np.int64).max,
-            size=env_batch_size,
-            dtype=np.int64)
-        observation = batched_env.reset()
-        reward = np.zeros(env_batch_size, np.float32)
-        raw_reward = np.zeros(env_batch_size, np.float32)
-        done = np.zeros(env_batch_size, np.bool)
-        abandoned = np.zeros(env_batch_size, np.bool)
+        for k in range(num_env_batches):
+          env_batches.append(_EnvBatch(
+              create_env_fn, inference_env_batch_size,
+              FLAGS.task * env_batch_size + k * inference_env_batch_size))
+
+        # Only the first environment of the first batch is rendered.
+        render_fns = [lambda: None] * num_env_batches
+        if is_rendering_enabled:
+          render_fns[0] = env_batches[0].env.render
 
         global_step = 0
-        episode_step = np.zeros(env_batch_size, np.int32)
-        episode_return = np.zeros(env_batch_size, np.float32)
-        episode_raw_return = np.zeros(env_batch_size, np.float32)
-        episode_step_sum = 0
-        episode_return_sum = 0
-        episode_raw_return_sum = 0
+        # Statistics of the episodes finished since the last log.
+        # Entries are written before they are read. Logs are only checked
+        # between batches, so there is room for one more batch of episodes
+        # past the capacity.
+        report_size = _EPISODE_REPORT_CAPACITY + inference_env_batch_size
+        report_step = np.empty(report_size, np.int64)
+        report_returns = np.empty((report_size, 2), np.float32)
         episodes_in_report = 0
 
         elapsed_inference_s_timer = timer_cls('actor/elapsed_inference_s', 1000)
+        elapsed_env_step_s_timer = timer_cls('actor/elapsed_env_step_s', 1000)
+        elapsed_env_reset_s_timer = timer_cls('actor/elapsed_env_reset_s', 10)
         last_log_time = timeit.default_timer()
         last_global_step = 0
+        if executor is not None:
+          # All inference calls then go through the executor, so they are
+          # issued in order and the actions are already fetched when the
+          # futures complete.
+          pending_actions = [
+              executor.submit(_inference, client, *env_batch.inference_args)
+              for env_batch in env_batches
+          ]
         while True:
-          tf.summary.experimental.set_step(actor_step)
-          env_output = utils.EnvOutput(reward, done, observation,
-                                       abandoned, episode_step)
-          with elapsed_inference_s_timer:
-            action = client.inference(env_id, run_id, env_output, raw_reward)
-          with timer_cls('actor/elapsed_env_step_s', 1000):
-            observation, reward, done, info = batched_env.step(action.numpy())
-          if is_rendering_enabled:
-            batched_env.render()
-          for i in range(env_batch_size):
-            episode_step[i] += 1
-            episode_return[i] += reward[i]
-            raw_reward[i] = float((info[i] or {}).get('score_reward',
-                                                      reward[i]))
-            episode_raw_return[i] += raw_reward[i]
-            # If the info dict contains an entry abandoned=True and the
-            # episode was ended (done=True), then we need to specially handle
-            # the final transition as per the explanations below.
-            abandoned[i] = (info[i] or {}).get('abandoned', False)
-            assert done[i] if abandoned[i] else True
-            if done[i]:
+          # The step is only read by summaries, which are no-ops otherwise.
+          if summaries_enabled:
+            tf.summary.experimental.set_step(actor_step)
+          for k, env_batch in enumerate(env_batches):
+            with elapsed_inference_s_timer:
+              if executor is None:
+                action = _inference(client, *env_batch.inference_args)
+              else:
+                action = pending_actions[k].result()
+            with elapsed_env_step_s_timer:
+              env_batch.step(action)
+            render_fns[k]()
+            reward = env_batch.reward
+            raw_reward = env_batch.raw_reward
+            episode_step = env_batch.episode_step
+            episode_returns = env_batch.episode_returns
+            # Per-episode bookkeeping only runs for the environments that are
+            # done, which is typically none or very few of them.
+            done_ids = np.flatnonzero(env_batch.done)
+            for i in done_ids:
               # If the episode was abandoned, we need to report the final
-              # transition including the final observation as if the episode has
-              # not terminated yet. This way, learning algorithms can use the
-              # transition for learning.
-              if abandoned[i]:
-                # We do not signal yet that the episode was abandoned. This will
-                # happen for the transition from the terminal state to the
+              # transition including the final observation as if the episode
+              # has not terminated yet. This way, learning algorithms can use
+              # the transition for learning.
+              if env_batch.abandoned[i]:
+                # We do not signal yet that the episode was abandoned. This
+                # will happen for the transition from the terminal state to the
                 # resetted state.
-                assert env_batch_size == 1 and i == 0, (
+                assert env_batch.batch_size == 1 and i == 0, (
                     'Mixing of batched and non-batched inference calls is not '
                     'yet supported')
-                env_output = utils.EnvOutput(reward,
-                                             np.array([False]), observation,
-                                             np.array([False]), episode_step)
+                abandoned_header = env_batch.header.copy()
+                abandoned_header['done'] = False
+                abandoned_header['abandoned'] = False
+                packed_header = utils.inference_header_bytes(abandoned_header)
                 with elapsed_inference_s_timer:
                   # action is ignored
-                  client.inference(env_id, run_id, env_output, raw_reward)
+                  if executor is None:
+                    _inference(client, packed_header, env_batch.observation)
+                  else:
+                    executor.submit(_inference, client, packed_header,
+                                    env_batch.observation).result()
                 reward[i] = 0.0
                 raw_reward[i] = 0.0
 
-              # Periodically log statistics.
-              current_time = timeit.default_timer()
-              episode_step_sum += episode_step[i]
-              episode_return_sum += episode_return[i]
-              episode_raw_return_sum += episode_raw_return[i]
+              # Record the episode statistics, which are periodically logged
+              # below.
+              report_step[episodes_in_report] = episode_step[i]
+              report_returns[episodes_in_report] = episode_returns[i]
               global_step += episode_step[i]
               episodes_in_report += 1
-              if current_time - last_log_time > 1:
+
+              episode_step[i] = 0
+              episode_returns[i] = 0
+
+            # Finally, we reset the episode which will report the transition
+            # from the terminal state to the resetted state in the next
+            # inference (with zero rewards). Skipped entirely in the common
+            # case where no environment is done.
+            if done_ids.size:
+              with elapsed_env_reset_s_timer:
+                env_batch.reset_if_done()
+
+              if env_batch.done[0]:
+                render_fns[k]()
+
+            if executor is not None:
+              pending_actions[k] = executor.submit(_inference, client,
+                                                   *env_batch.inference_args)
+
+            # Periodically log statistics, while the inference is in flight
+            # with double buffering.
+            # Also log early when the report buffers are full.
+            if episodes_in_report:
+              current_time = timeit.default_timer()
+              if (current_time - last_log_time > 1 or
+                  episodes_in_report >= _EPISODE_REPORT_CAPACITY):
+                mean_return, mean_raw_return = np.mean(
+                    report_returns[:episodes_in_report], axis=0)
                 logging.info(
                     'Actor steps: %i, Return: %f Raw return: %f '
                     'Episode steps: %f, Speed: %f steps/s', global_step,
-                    episode_return_sum / episodes_in_report,
-                    episode_raw_return_sum / episodes_in_report,
-                    episode_step_sum / episodes_in_report,
+                    mean_return, mean_raw_return,
+                    np.mean(report_step[:episodes_in_report]),
                     (global_step - last_global_step) /
                     (current_time - last_log_time))
                 last_global_step = global_step
-                episode_return_sum = 0
-                episode_raw_return_sum = 0
-                episode_step_sum = 0
                 episodes_in_report = 0
                 last_log_time = current_time
 
-              episode_step[i] = 0
-              episode_return[i] = 0
-              episode_raw_return[i] = 0
-
-          # Finally, we reset the episode which will report the transition
-          # from the terminal state to the resetted state in the next loop
-          # iteration (with zero rewards).
-          with timer_cls('actor/elapsed_env_reset_s', 10):
-            observation = batched_env.reset_if_done(done)
-
-          if is_rendering_enabled and done[0]:
-            batched_env.render()
-
           actor_step += 1
       except (tf.errors.UnavailableError, tf.errors.CancelledError) as e:
         logging.exception(e)
-        batched_env.close()
+        if executor is not None:
+          executor.shutdown(wait=True)
+        for env_batch in env_batches:
+          env_batch.env.close()
+        # The client has to be recreated since its call stream is broken, but
+        # back off when the learner keeps failing before any step completes.
+        if actor_step > actor_step_at_connect:
+          reconnect_delay_s = _MIN_RECONNECT_DELAY_S
+        logging.info('Reconnecting in %f seconds.', reconnect_delay_s)
+        time.sleep(reconnect_delay_s)
+        reconnect_delay_s = min(2 * reconnect_delay_s, _MAX_RECONNECT_DELAY_S)
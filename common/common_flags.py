@@ -38,6 +38,12 @@ flags.DEFINE_integer(
     'env_batch_size', 1,
     'How many environments to operate on together in a batch.'
 )
+flags.DEFINE_bool(
+    'actor_double_buffering', False,
+    'Whether actors split their environments in two batches of '
+    'env_batch_size / 2, stepping one batch while the inference for the other '
+    'one is in flight. Each inference call then contains env_batch_size / 2 '
+    'environments.')
 flags.DEFINE_integer('num_envs', 4,
                      'Total number of environments in all actors.')
 flags.DEFINE_integer('num_action_repeats', 1, 'Number of action repeats.')
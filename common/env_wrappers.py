@@ -15,6 +15,8 @@
 
 """Environment wrappers."""
 
+import types
+
 from absl import flags
 import gym
 import numpy as np
@@ -22,6 +24,10 @@ import tensorflow as tf
 
 FLAGS = flags.FLAGS
 
+# Read-only stand-in for missing info dicts, shared to avoid an allocation per
+# environment step.
+_EMPTY_INFO = types.MappingProxyType({})
+
 
 def spec_to_box(spec):
   minimum, maximum = -np.inf, np.inf
@@ -147,6 +153,18 @@ class BatchedEnvironment:
     self._envs = [create_env_fn(id) for id in env_ids]
     self._env_ids = np.array(env_ids, np.int32)
     self._obs = None
+    # Observations are batched in the dtype declared by the observation space
+    # (e.g. uint8 for frames), which is also the dtype the learner expects.
+    # This avoids sending upcasted observations over the wire.
+    observation_space = self._envs[0].observation_space
+    if isinstance(observation_space, gym.spaces.Box):
+      self._obs_dtype = observation_space.dtype
+    else:
+      self._obs_dtype = None
+    # Per-environment entries extracted from the info dicts by step_into(). They
+    # are fully overwritten by each step, so they don't need to be initialized.
+    self._score_rewards = np.empty(batch_size, np.float32)
+    self._abandoned = np.empty(batch_size, bool)
 
   @property
   def env_ids(self):
@@ -168,18 +186,63 @@ class BatchedEnvironment:
     Returns:
       Mapped observations.
     """
+    if self._obs_dtype is not None:
+      return np.array(self._obs, self._obs_dtype)
     return tf.nest.map_structure(lambda *args: np.array(args), *self._obs)
 
   def step(self, action_batch):
     """Does one step for all batched environments sequentially."""
     num_envs = self._batch_size
-    rewards = np.zeros(num_envs, np.float32)
-    dones = np.zeros(num_envs, np.bool)
+    rewards = np.empty(num_envs, np.float32)
+    dones = np.empty(num_envs, bool)
+    infos = self._step(action_batch, rewards, dones)
+    return self._mapped_obs, rewards, dones, infos
+
+  def step_into(self, action_batch, observations, rewards, dones):
+    """Like step(), but writes the results into caller-supplied buffers.
+
+    Args:
+      action_batch: Actions for all the batched environments.
+      observations: Batched observation buffers, with the same structure as the
+        observations returned by step().
+      rewards: Float32 buffer of shape [batch_size] for the rewards.
+      dones: Bool buffer of shape [batch_size] for the done flags.
+
+    Returns:
+      A tuple (infos, score_rewards, abandoned). `score_rewards` and `abandoned`
+      hold the 'score_reward' (defaulting to the reward) and 'abandoned'
+      (defaulting to False) entries of the info dicts, so that callers don't
+      have to look them up for every environment. Both arrays are owned by the
+      wrapper and overwritten by the next step.
+    """
+    infos = self._step(action_batch, rewards, dones, observations)
+    return infos, self._score_rewards, self._abandoned
+
+  def _step(self, action_batch, rewards, dones, observations=None):
+    """Steps all environments, writing into the given buffers."""
+    num_envs = self._batch_size
     infos = [None] * num_envs
     for i in range(num_envs):
       self._obs[i], rewards[i], dones[i], infos[i] = self._envs[i].step(
           action_batch[i])
-    return self._mapped_obs, rewards, dones, infos
+      if observations is not None:
+        self._copy_obs_into(observations, i)
+    # Extract the info entries in one pass instead of assigning numpy scalars
+    # one by one.
+    self._score_rewards[:] = np.fromiter(
+        ((info or _EMPTY_INFO).get('score_reward', r)
+         for info, r in zip(infos, rewards)),
+        dtype=np.float32, count=num_envs)
+    self._abandoned[:] = np.fromiter(
+        ((info or _EMPTY_INFO).get('abandoned', False) for info in infos),
+        dtype=bool, count=num_envs)
+    return infos
+
+  def _copy_obs_into(self, observations, i):
+    """Writes the observation of environment i into the batched buffers."""
+    for buf, obs in zip(tf.nest.flatten(observations),
+                        tf.nest.flatten(self._obs[i])):
+      buf[i] = obs
 
   def reset(self):
     """Reset all environments."""
@@ -204,6 +267,21 @@ class BatchedEnvironment:
 
     return self._mapped_obs
 
+  def reset_if_done_into(self, done, observations):
+    """Like reset_if_done(), but only writes the reset observations.
+
+    Args:
+      done: An array that specifies which environments are 'done', meaning their
+        episode is terminated.
+      observations: Batched observation buffers holding the observations of all
+        environments, see step_into(). Only the entries of the environments
+        which are reset are overwritten.
+    """
+    assert self._obs is not None, 'reset_if_done() called before reset()'
+    for i in np.flatnonzero(done):
+      self._obs[i] = self.envs[i].reset()
+      self._copy_obs_into(observations, i)
+
   def render(self, mode='human', **kwargs):
     # Render only the first one
     self._envs[0].render(mode, **kwargs)
@@ -77,6 +77,11 @@ class ParametricDistribution(abc.ABC):
   def sample(self, parameters):
     return self.create_dist(parameters).sample()
 
+  def _log_det_jacobian(self, actions):
+    """Log-det-jacobian of the postprocessor for pre-postprocessing actions."""
+    return self._postprocessor.forward_log_det_jacobian(
+        tf.cast(actions, tf.float32), event_ndims=self._jacobian_event_ndims)
+
   def log_prob(self, parameters, actions):
     """Compute the log probability of the actions.
 
@@ -88,15 +93,50 @@ class ParametricDistribution(abc.ABC):
         actions are continuous.
     """
     dist = self.create_dist(parameters)
-    log_probs = dist.log_prob(actions)
-    log_probs -= self._postprocessor.forward_log_det_jacobian(
-        tf.cast(actions, tf.float32), event_ndims=self._jacobian_event_ndims)
+    log_probs = dist.log_prob(actions) - self._log_det_jacobian(actions)
     if self._event_ndims == 1:
       log_probs = tf.reduce_sum(log_probs, axis=-1)  # sum over action dimension
     return log_probs
 
+  def log_prob_pair(self, parameters_a, parameters_b, actions):
+    """Compute the log probabilities of the actions under two parametrizations.
+
+    This is equivalent to calling log_prob() once with each set of parameters,
+    but the distribution is only built once (over both sets of parameters
+    stacked together) and the postprocessor jacobian, which only depends on the
+    actions, is only computed once.
+
+    Args:
+      parameters_a: Tensor of parameters for the first probability function.
+      parameters_b: Tensor of parameters for the second probability function.
+        It must have the same shape as 'parameters_a'.
+      actions: Tensor of actions before postprocessing.
+    Returns:
+      A pair of tensors of log probabilities, for 'parameters_a' and
+        'parameters_b' respectively.
+    """
+    dist = self.create_dist(tf.stack([parameters_a, parameters_b]))
+    log_probs = dist.log_prob(actions) - self._log_det_jacobian(actions)
+    if self._event_ndims == 1:
+      log_probs = tf.reduce_sum(log_probs, axis=-1)  # sum over action dimension
+    return log_probs[0], log_probs[1]
+
   def entropy(self, parameters):
     """Return the entropy of the given distribution."""
+    return self.entropy_and_dist(parameters)[0]
+
+  def entropy_and_dist(self, parameters):
+    """Return the entropy together with the underlying tfp.distribution.
+
+    This lets callers which also need statistics of the distribution (e.g. its
+    scale for logging) map the parameters to a distribution only once.
+
+    Args:
+      parameters: Tensor of parameters for the probability function.
+    Returns:
+      A pair of the entropy tensor and the tfp.distribution created from
+        'parameters'.
+    """
     dist = self.create_dist(parameters)
     entropy = dist.entropy()
     entropy += self._postprocessor.forward_log_det_jacobian(
@@ -104,7 +144,7 @@ class ParametricDistribution(abc.ABC):
         event_ndims=self._jacobian_event_ndims)
     if self._event_ndims == 1:
       entropy = tf.reduce_sum(entropy, axis=-1)
-    return entropy
+    return entropy, dist
 
   def kl_divergence(self, parameters_a, parameters_b):
     """Return KL divergence between the two distributions."""
@@ -85,6 +85,33 @@ class ParametricDistributionTest(tf.test.TestCase):
 
     self.assertAllClose(log_probs, continuous_log_probs + discrete_log_probs)
 
+  def test_log_prob_pair(self):
+    for space in [self.create_box_space(), self.create_multidiscrete_space(),
+                  self.create_tuple_space()]:
+      distribution = parametric_distribution.get_parametric_distribution_for_action_space(
+          space)
+      parameters_shape = [5, 2, distribution.param_size]
+      parameters_a = tf.random.normal(parameters_shape)
+      parameters_b = tf.random.normal(parameters_shape)
+      actions = distribution.sample(parameters_a)
+
+      log_probs_a, log_probs_b = distribution.log_prob_pair(
+          parameters_a, parameters_b, actions)
+      self.assertAllClose(log_probs_a,
+                          distribution.log_prob(parameters_a, actions))
+      self.assertAllClose(log_probs_b,
+                          distribution.log_prob(parameters_b, actions))
+
+  def test_entropy_and_dist(self):
+    distribution = parametric_distribution.get_parametric_distribution_for_action_space(
+        self.create_box_space())
+    parameters = tf.random.normal([5, 2, distribution.param_size])
+
+    entropy, dist = distribution.entropy_and_dist(parameters)
+    self.assertEqual(entropy.shape, [5, 2])
+    self.assertAllClose(dist.scale,
+                        distribution.create_dist(parameters).scale)
+
 
 if __name__ == '__main__':
   tf.test.main()
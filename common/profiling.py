@@ -17,10 +17,48 @@
 """
 
 import collections
+import queue
+import threading
 import time
+
+from absl import logging
 import tensorflow as tf
 
 
+# Summaries exported in the background by ExportingTimer, as tuples
+# (summary_writer, step, summary_name, value).
+_summary_queue = queue.Queue()
+_summary_thread = None
+_summary_thread_lock = threading.Lock()
+
+
+def _summary_export_loop():
+  while True:
+    summary_writer, step, summary_name, value = _summary_queue.get()
+    try:
+      with summary_writer.as_default():
+        tf.summary.scalar(summary_name, value, step=step)
+    except Exception:  # pylint: disable=broad-except
+      # Keep the thread alive, later summaries may be exported fine.
+      logging.exception('Failed to export summary %s', summary_name)
+    finally:
+      _summary_queue.task_done()
+
+
+def _export_in_background(summary_writer, summary_name, value):
+  """Queues a scalar summary to be written by the summary thread."""
+  global _summary_thread
+  if _summary_thread is None:
+    with _summary_thread_lock:
+      if _summary_thread is None:
+        _summary_thread = threading.Thread(
+            target=_summary_export_loop, name='summary_export', daemon=True)
+        _summary_thread.start()
+  # The step is read now since the summary thread has its own summary state.
+  _summary_queue.put_nowait((summary_writer, tf.summary.experimental.get_step(),
+                             summary_name, value))
+
+
 class Aggregator(object):
   """Allows accumulating values and computing their mean."""
 
@@ -53,24 +91,36 @@ class ExportingTimer(object):
 
   which will record it takes to execute 'env.step()' in seconds, and export the
   average as a tf.summary under 'actor/env_steps_s' every 100 invocations.
+
+  When a summary writer is passed, the summaries are written to it from a
+  background thread so that the TF calls don't block the timed code path.
   """
 
   # Maps tf.summary names to the sum and counts of elapsed times (seconds).
   # This is global for all instances of ExportingTimer.
   aggregators = collections.defaultdict(Aggregator)
 
-  def __init__(self, summary_name, aggregation_window_size):
+  def __init__(self, summary_name, aggregation_window_size,
+               summary_writer=None):
     self.summary_name = summary_name
     self.aggregation_window_size = aggregation_window_size
+    self.summary_writer = summary_writer
+    # Looked up once so that entering and exiting the timer is cheap.
+    self.aggregator = ExportingTimer.aggregators[summary_name]
 
   def __enter__(self):
-    self.start_time_s = time.time()
+    self.start_time_s = time.perf_counter()
     return self
 
   def __exit__(self, exc_type, exc_value, traceback):
-    self.elapsed_s = time.time() - self.start_time_s
-    aggregator = self.aggregators[self.summary_name]
+    self.elapsed_s = time.perf_counter() - self.start_time_s
+    aggregator = self.aggregator
     aggregator.add(self.elapsed_s)
     if aggregator.count >= self.aggregation_window_size:
-      tf.summary.scalar(self.summary_name, aggregator.average())
+      average_s = aggregator.average()
+      if self.summary_writer is None:
+        tf.summary.scalar(self.summary_name, average_s)
+      else:
+        _export_in_background(self.summary_writer, self.summary_name,
+                              average_s)
       aggregator.reset()
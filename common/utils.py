@@ -42,6 +42,49 @@ EnvOutput = collections.namedtuple(
     'EnvOutput', 'reward done observation abandoned episode_step')
 
 
+# Per-environment scalars which actors send with each inference call. They are
+# packed in a single uint8 tensor of shape [batch_size, itemsize], so that a
+# call carries two tensors (header and observations) instead of eight.
+INFERENCE_HEADER_DTYPE = np.dtype([
+    ('env_id', '<i4'),
+    ('run_id', '<i8'),
+    ('reward', '<f4'),
+    ('raw_reward', '<f4'),
+    ('episode_step', '<i4'),
+    ('done', '?'),
+    ('abandoned', '?'),
+])
+
+
+def inference_header_bytes(header):
+  """Returns the uint8 view of an array of INFERENCE_HEADER_DTYPE (no copy)."""
+  return header.view(np.uint8).reshape(header.shape[0], header.dtype.itemsize)
+
+
+def unpack_inference_header(packed_header):
+  """Splits inference headers packed by the actors into their fields.
+
+  Args:
+    packed_header: uint8 tensor of shape
+      [batch_size, INFERENCE_HEADER_DTYPE.itemsize].
+
+  Returns:
+    A dict mapping the field names of INFERENCE_HEADER_DTYPE to tensors of
+    shape [batch_size].
+  """
+  fields = {}
+  for name in INFERENCE_HEADER_DTYPE.names:
+    dtype, offset = INFERENCE_HEADER_DTYPE.fields[name]
+    field_bytes = packed_header[:, offset:offset + dtype.itemsize]
+    if dtype == np.bool_:
+      fields[name] = tf.not_equal(field_bytes[:, 0], 0)
+    else:
+      # tf.bitcast uses the host byte order, which matches the little-endian
+      # layout above on all supported platforms.
+      fields[name] = tf.bitcast(field_bytes, tf.as_dtype(dtype))
+  return fields
+
+
 Settings = collections.namedtuple(
     'Settings', 'strategy inference_devices training_strategy encode decode')
 
@@ -117,7 +160,14 @@ def init_learner(num_training_tpus):
 
 
 class UnrollStore(tf.Module):
-  """Utility module for combining individual environment steps into unrolls."""
+  """Utility module for combining individual environment steps into unrolls.
+
+  Each leaf of the timestep structure is stored in a single variable of shape
+  [num_envs, num_overlapping_steps + unroll_length + 1, ...], together with a
+  per-environment write index. Appending a timestep is a scatter at
+  (env_id, index) and completed unrolls are read back with one gather of
+  contiguous rows per leaf.
+  """
 
   def __init__(self,
                num_envs,
@@ -528,10 +578,37 @@ class Aggregator(tf.Module):
         tf.shape(env_ids),
         tf.shape(tf.unique(env_ids)[0]),
         message=f'Duplicate environment ids in Aggregator: {self.name}')
+    self._replace_unchecked(env_ids, values)
+
+  def _replace_unchecked(self, env_ids, values):
     tf.nest.assert_same_structure(values, self._state)
     for s, v in zip(tf.nest.flatten(self._state), tf.nest.flatten(values)):
       s.scatter_update(tf.IndexedSlices(v, env_ids))
 
+  @staticmethod
+  def replace_many(aggregators, env_ids, values):
+    """Replaces the state of several Aggregators for the same environments.
+
+    This is equivalent to calling replace() on each Aggregator, but the check
+    for duplicate environment ids is only done once.
+
+    Args:
+      aggregators: List of Aggregators.
+      env_ids: 1D tensor with the list of environment IDs.
+      values: List with, for each Aggregator, a structure of tensors as
+        expected by replace().
+    """
+    assert len(aggregators) == len(values)
+    with tf.name_scope('Aggregator_replace_many'):
+      env_ids = tf.convert_to_tensor(env_ids)
+      tf.debugging.assert_equal(
+          tf.shape(env_ids),
+          tf.shape(tf.unique(env_ids)[0]),
+          message='Duplicate environment ids in Aggregators: ' +
+          ', '.join(a.name for a in aggregators))
+      for a, v in zip(aggregators, values):
+        a._replace_unchecked(env_ids, v)
+
 
 class ProgressLogger(object):
   """Helper class for performing periodic logging of the training progress."""
@@ -976,10 +1053,15 @@ def validate_learner_config(config, num_hosts=1):
   assert config.env_batch_size > 0
   if config.inference_batch_size == -1:
     config.inference_batch_size = max(1, config.num_envs // (2 * num_hosts))
-  assert config.inference_batch_size % config.env_batch_size == 0, (
+  # Number of environments in each inference call made by an actor.
+  actor_batch_size = config.env_batch_size
+  if config.actor_double_buffering:
+    assert config.env_batch_size % 2 == 0
+    actor_batch_size //= 2
+  assert config.inference_batch_size % actor_batch_size == 0, (
       'Learner-side batch size (=%d) must be exact multiple of the '
       'actor-side batch size (=%d).' %
-      (config.inference_batch_size, config.env_batch_size))
+      (config.inference_batch_size, actor_batch_size))
   assert config.num_envs >= config.inference_batch_size * num_hosts, (
       'Inference batch size is bigger than the number of environments.')
 
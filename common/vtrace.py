@@ -82,7 +82,37 @@ def from_importance_weights(
   """
 
   log_rhos = target_action_log_probs - behaviour_action_log_probs
+  return from_log_rhos(
+      log_rhos, discounts, rewards, values, bootstrap_value,
+      clip_rho_threshold=clip_rho_threshold,
+      clip_pg_rho_threshold=clip_pg_rho_threshold, lambda_=lambda_, name=name)
 
+
+def from_log_rhos(
+    log_rhos, discounts, rewards, values, bootstrap_value,
+    clip_rho_threshold=1.0, clip_pg_rho_threshold=1.0, lambda_=1.0,
+    name='vtrace_from_importance_weights'):
+  r"""V-trace from precomputed log importance weights.
+
+  Same as from_importance_weights(), for callers that already computed the
+  log importance weights (e.g. because they also need them for another term of
+  the loss).
+
+  Args:
+    log_rhos: A float32 tensor of shape [T, B] with the log importance weights,
+      i.e. target_action_log_probs - behaviour_action_log_probs.
+    discounts: See from_importance_weights().
+    rewards: See from_importance_weights().
+    values: See from_importance_weights().
+    bootstrap_value: See from_importance_weights().
+    clip_rho_threshold: See from_importance_weights().
+    clip_pg_rho_threshold: See from_importance_weights().
+    lambda_: See from_importance_weights().
+    name: The name scope that all V-trace operations will be created in.
+
+  Returns:
+    A VTraceReturns namedtuple, see from_importance_weights().
+  """
   log_rhos = tf.convert_to_tensor(log_rhos, dtype=tf.float32)
   discounts = tf.convert_to_tensor(discounts, dtype=tf.float32)
   rewards = tf.convert_to_tensor(rewards, dtype=tf.float32)
@@ -121,11 +151,14 @@ def from_importance_weights(
         [values[1:], tf.expand_dims(bootstrap_value, 0)], axis=0)
     deltas = clipped_rhos * (rewards + discounts * values_t_plus_1 - values)
 
+    # The per-step coefficients are computed and split along time once, so that
+    # each step of the (unrolled) backward recursion is a single multiply-add.
+    discount_cs = tf.unstack(discounts * cs)
+    deltas = tf.unstack(deltas)
     acc = tf.zeros_like(bootstrap_value)
     vs_minus_v_xs = []
     for i in range(int(discounts.shape[0]) - 1, -1, -1):
-      discount, c, delta = discounts[i], cs[i], deltas[i]
-      acc = delta + discount * c * acc
+      acc = deltas[i] + discount_cs[i] * acc
       vs_minus_v_xs.append(acc)
     vs_minus_v_xs = vs_minus_v_xs[::-1]
 
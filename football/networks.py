@@ -82,6 +82,7 @@ class GFootball(tf.Module):
         _Stack(num_ch, num_blocks)
         for num_ch, num_blocks in [(16, 2), (32, 2), (32, 2), (32, 2)]
     ]
+    self._flatten = tf.keras.layers.Flatten()
     self._conv_to_linear = tf.keras.layers.Dense(
         256, kernel_initializer='lecun_normal')
 
@@ -107,14 +108,16 @@ class GFootball(tf.Module):
       conv_out = stack(conv_out)
 
     conv_out = tf.nn.relu(conv_out)
-    conv_out = tf.keras.layers.Flatten()(conv_out)
+    conv_out = self._flatten(conv_out)
 
     conv_out = self._conv_to_linear(conv_out)
     return tf.nn.relu(conv_out)
 
   def _head(self, core_output):
-    policy_logits = self._policy_logits(core_output)
-    baseline = tf.squeeze(self._baseline(core_output), axis=-1)
+    # The dense layers return bfloat16 under --mixed_bfloat16.
+    policy_logits = tf.cast(self._policy_logits(core_output), tf.float32)
+    baseline = tf.cast(
+        tf.squeeze(self._baseline(core_output), axis=-1), tf.float32)
 
     # Sample an action from the policy.
     new_action = self._parametric_action_distribution.sample(policy_logits)
@@ -16,7 +16,6 @@
 
 from absl.testing import parameterized
 import gym
-import numpy as np
 from seed_rl.common import utils
 from seed_rl.football import observation
 import tensorflow as tf
@@ -35,19 +34,21 @@ class UtilsTest(tf.test.TestCase, parameterized.TestCase):
     for _ in range(10):
       obs, _, done, _ = env.step(env.action_space.sample())
 
-      baseline_obs = tf.cast(np.array(obs), tf.float32)
+      baseline_obs = tf.cast(obs, tf.float32)
+      num_channels = obs.shape[-1]
 
-      packed_obs = observation.PackedBitsObservation.observation(env, obs)
-      packed_obs = tf.convert_to_tensor(packed_obs)
+      # The packed observation is converted to a tensor once and shared by the
+      # TPU and non-TPU unpacking paths.
+      packed_obs = tf.constant(
+          observation.PackedBitsObservation.observation(env, obs))
       tpu_obs = observation.unpackbits(utils.tpu_encode(packed_obs))
       non_tpu_obs = observation.unpackbits(packed_obs)
-      # baseline_obs has less than 16 channels, so first channels should
-      # correspond to baseline_obs and then all the rest should be 0
-      self.assertAllEqual(baseline_obs, tpu_obs[..., :obs.shape[-1]])
-      self.assertAllEqual(baseline_obs, non_tpu_obs[..., :obs.shape[-1]])
-      self.assertAllEqual(tf.math.reduce_sum(tpu_obs[..., obs.shape[-1]:]), 0)
-      self.assertAllEqual(tf.math.reduce_sum(non_tpu_obs[..., obs.shape[-1]:]),
-                          0)
+      for unpacked_obs in (tpu_obs, non_tpu_obs):
+        # baseline_obs has less than 16 channels, so first channels should
+        # correspond to baseline_obs and then all the rest should be 0
+        self.assertAllEqual(baseline_obs, unpacked_obs[..., :num_channels])
+        self.assertAllEqual(
+            tf.math.reduce_sum(unpacked_obs[..., num_channels:]), 0)
 
       if done:
         env.reset()
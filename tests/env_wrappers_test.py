@@ -0,0 +1,85 @@
+# coding=utf-8
+# Copyright 2019 The SEED Authors
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for env_wrappers."""
+
+import gym
+import numpy as np
+from seed_rl.common import env_wrappers
+import tensorflow as tf
+
+
+class _FakeEnv(gym.Env):
+  """Environment whose observations encode its id and episode step."""
+
+  observation_space = gym.spaces.Box(0, 255, [2], np.uint8)
+  action_space = gym.spaces.Discrete(4)
+
+  def __init__(self, env_id):
+    self._env_id = env_id
+    self._step = 0
+
+  def _observation(self):
+    return np.array([self._env_id, self._step], np.uint8)
+
+  def reset(self):
+    self._step = 0
+    return self._observation()
+
+  def step(self, action):
+    self._step += 1
+    info = {'score_reward': 10. * action} if self._env_id % 2 else {}
+    return self._observation(), float(action), self._step == action, info
+
+
+class BatchedEnvironmentTest(tf.test.TestCase):
+
+  def test_step_into_matches_step(self):
+    env = env_wrappers.BatchedEnvironment(_FakeEnv, 3, id_offset=5)
+    ref_env = env_wrappers.BatchedEnvironment(_FakeEnv, 3, id_offset=5)
+    observations = env.reset().copy()
+    ref_env.reset()
+    rewards = np.empty(3, np.float32)
+    dones = np.empty(3, bool)
+    actions = np.array([1, 2, 3])
+
+    infos, score_rewards, abandoned = env.step_into(
+        actions, observations, rewards, dones)
+    ref_obs, ref_rewards, ref_dones, ref_infos = ref_env.step(actions)
+
+    self.assertAllEqual(ref_obs, observations)
+    self.assertEqual(np.uint8, observations.dtype)
+    self.assertAllEqual(ref_rewards, rewards)
+    self.assertAllEqual(ref_dones, dones)
+    self.assertEqual(ref_infos, infos)
+    self.assertAllEqual([10., 2., 30.], score_rewards)
+    self.assertAllEqual([False, False, False], abandoned)
+
+  def test_reset_if_done_into(self):
+    env = env_wrappers.BatchedEnvironment(_FakeEnv, 3, id_offset=0)
+    observations = env.reset().copy()
+    rewards = np.empty(3, np.float32)
+    dones = np.empty(3, bool)
+    env.step_into(np.array([1, 2, 1]), observations, rewards, dones)
+    self.assertAllEqual([True, False, True], dones)
+    self.assertAllEqual([[0, 1], [1, 1], [2, 1]], observations)
+
+    # Mark the rows which must not be rewritten.
+    observations[1] = 42
+    env.reset_if_done_into(dones, observations)
+    self.assertAllEqual([[0, 0], [42, 42], [2, 0]], observations)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,162 @@
+# coding=utf-8
+# Copyright 2019 The SEED Authors
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Smoke tests for the V-trace learner."""
+
+import tempfile
+import threading
+from unittest import mock
+import uuid
+
+from absl.testing import flagsaver
+import gym
+import numpy as np
+from seed_rl.agents.vtrace import learner
+from seed_rl.agents.vtrace import networks
+from seed_rl.common import actor
+from seed_rl.common import utils
+import tensorflow as tf
+
+
+class _StopActor(Exception):
+  """Raised by the fake environment to stop the actor."""
+
+
+class _FakeEnv(gym.Env):
+  """Environment with episodes of 5 steps and constant rewards."""
+
+  observation_space = gym.spaces.Box(-1., 1., [4], np.float32)
+  action_space = gym.spaces.Discrete(2)
+
+  def __init__(self, unused_env_id):
+    self._step = 0
+
+  def reset(self):
+    self._step = 0
+    return np.zeros([4], np.float32)
+
+  def step(self, action):
+    self._step += 1
+    observation = np.full([4], self._step / 10, np.float32)
+    return observation, 1., self._step == 5, {}
+
+  def close(self):
+    # The actor only closes its environments when it loses its connection to
+    # the learner, which happens when the learner shuts down its server.
+    raise _StopActor()
+
+
+def _create_optimizer(final_iteration):
+  learning_rate_fn = tf.keras.optimizers.schedules.PolynomialDecay(
+      1e-3, final_iteration, 0)
+  return tf.keras.optimizers.Adam(learning_rate_fn), learning_rate_fn
+
+
+class LearnerTest(tf.test.TestCase):
+
+  def _train(self, **flag_values):
+    """Runs the learner against an actor for two iterations.
+
+    Args:
+      **flag_values: Flags to set in addition to the small test configuration.
+
+    Returns:
+      A tuple (agent, logs) with the trained agent and the last values logged
+      by the learner, as a dict.
+    """
+    agents = []
+    loggers = []
+
+    def create_agent(unused_action_space, unused_observation_space,
+                     parametric_action_distribution):
+      agents.append(networks.MLPandLSTM(parametric_action_distribution,
+                                        mlp_sizes=[8], lstm_sizes=[8]))
+      return agents[-1]
+
+    def create_logger(*args, **kwargs):
+      loggers.append(utils.ProgressLogger(*args, **kwargs))
+      return loggers[-1]
+
+    actor_errors = []
+
+    def run_actor():
+      try:
+        actor.actor_loop(_FakeEnv)
+      except Exception as e:  # pylint: disable=broad-except
+        actor_errors.append(e)
+
+    with flagsaver.flagsaver(
+        logdir=tempfile.mkdtemp(dir=self.get_temp_dir()),
+        server_address='unix:/tmp/learner_test_%s' % uuid.uuid4(),
+        num_envs=2,
+        env_batch_size=2,
+        inference_batch_size=2,
+        batch_size=2,
+        unroll_length=4,
+        # Two training iterations.
+        total_environment_frames=2 * 2 * 4,
+        **flag_values):
+      actor_thread = threading.Thread(target=run_actor, daemon=True)
+      actor_thread.start()
+      with mock.patch.object(utils, 'ProgressLogger', create_logger):
+        learner.learner_loop(_FakeEnv, create_agent, _create_optimizer)
+      actor_thread.join(timeout=60)
+
+    self.assertFalse(actor_thread.is_alive())
+    self.assertLen(actor_errors, 1)
+    self.assertIsInstance(actor_errors[0], _StopActor)
+    logger, = loggers
+    logs = dict(zip(logger.log_keys, logger.ready_values.numpy()))
+    agent, = agents
+    return agent, logs
+
+  def _assert_finite_float32(self, tensors):
+    for t in tf.nest.flatten(tensors):
+      self.assertEqual(tf.float32, t.dtype)
+      self.assertTrue(np.all(np.isfinite(np.asarray(t))))
+
+  def test_mixed_bfloat16(self):
+    agent, logs = self._train(mixed_bfloat16=True)
+
+    # The policy only applies to the agent.
+    self.assertEqual(
+        'float32', tf.keras.mixed_precision.experimental.global_policy().name)
+    self.assertEqual('bfloat16', agent._compute_dtype)
+    self.assertIn('losses/total', logs)
+    self._assert_finite_float32(list(logs.values()))
+    self._assert_finite_float32(agent.trainable_variables)
+
+    env_outputs = utils.EnvOutput(
+        reward=tf.zeros([3]),
+        done=tf.constant([False, True, False]),
+        observation=tf.fill([3, 4], .5),
+        abandoned=tf.zeros([3], tf.bool),
+        episode_step=tf.zeros([3], tf.int32))
+    outputs, agent_state = agent(
+        tf.zeros([3], tf.int64), env_outputs, agent.initial_state(3))
+    self._assert_finite_float32(
+        (outputs.policy_logits, outputs.baseline, agent_state))
+
+
+  def test_use_xla(self):
+    # Traces and runs the XLA-compiled gradient computation, on CPU here.
+    agent, logs = self._train(use_xla=True)
+
+    self.assertIn('losses/total', logs)
+    self._assert_finite_float32(list(logs.values()))
+    self._assert_finite_float32(agent.trainable_variables)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,84 @@
+# coding=utf-8
+# Copyright 2019 The SEED Authors
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for profiling."""
+
+import glob
+import os
+from unittest import mock
+
+from seed_rl.common import profiling
+import tensorflow as tf
+
+
+def _read_scalars(logdir):
+  """Returns the (tag, step, value) of the scalar summaries in logdir."""
+  scalars = []
+  for path in sorted(glob.glob(os.path.join(logdir, 'events.out.tfevents.*'))):
+    for event in tf.compat.v1.train.summary_iterator(path):
+      for value in event.summary.value:
+        scalars.append((value.tag, event.step,
+                        float(tf.make_ndarray(value.tensor))))
+  return scalars
+
+
+class ExportingTimerTest(tf.test.TestCase):
+
+  def test_exports_average_seconds(self):
+    logdir = os.path.join(self.get_temp_dir(), 'inline')
+    summary_writer = tf.summary.create_file_writer(logdir)
+    # Timer enter/exit pairs of 0.5 and 0.25 seconds.
+    times = [10., 10.5, 20., 20.25]
+    with mock.patch.object(profiling, 'time') as mock_time:
+      mock_time.perf_counter.side_effect = times
+      with summary_writer.as_default():
+        tf.summary.experimental.set_step(7)
+        with profiling.ExportingTimer('test/inline_s', 2) as timer:
+          pass
+        self.assertAlmostEqual(0.5, timer.elapsed_s)
+        with profiling.ExportingTimer('test/inline_s', 2) as timer:
+          pass
+        self.assertAlmostEqual(0.25, timer.elapsed_s)
+    summary_writer.flush()
+
+    self.assertEqual([('test/inline_s', 7, 0.375)], _read_scalars(logdir))
+    self.assertEqual(
+        0, profiling.ExportingTimer.aggregators['test/inline_s'].count)
+
+  def test_exports_in_background(self):
+    logdir = os.path.join(self.get_temp_dir(), 'background')
+    summary_writer = tf.summary.create_file_writer(logdir)
+    failing_writer = mock.Mock()
+    failing_writer.as_default.side_effect = RuntimeError('Writer is closed.')
+    tf.summary.experimental.set_step(3)
+    with profiling.ExportingTimer(
+        'test/failing_s', 1, summary_writer=failing_writer):
+      pass
+    with profiling.ExportingTimer(
+        'test/background_s', 1, summary_writer=summary_writer) as timer:
+      pass
+    # The step is read when the summary is queued, not when it is written.
+    tf.summary.experimental.set_step(4)
+    profiling._summary_queue.join()
+    summary_writer.flush()
+
+    # The failure to write the first summary did not stop the export thread.
+    self.assertTrue(profiling._summary_thread.is_alive())
+    (tag, step, value), = _read_scalars(logdir)
+    self.assertEqual(('test/background_s', 3), (tag, step))
+    self.assertAlmostEqual(timer.elapsed_s, value, places=6)
+
+
+if __name__ == '__main__':
+  tf.test.main()
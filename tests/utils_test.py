@@ -241,6 +241,41 @@ class AggregatorTest(tf.test.TestCase):
     agg.replace([0, 2], tf.convert_to_tensor([1, 2]))
     self.assertAllEqual([1, 43, 2, 0], agg.read([0, 1, 2, 3]))
 
+  def test_many(self):
+    agg1 = utils.Aggregator(num_envs=4, specs=tf.TensorSpec([], tf.int32))
+    agg2 = utils.Aggregator(num_envs=4, specs=tf.TensorSpec([2], tf.float32))
+
+    utils.Aggregator.replace_many(
+        [agg1, agg2], [1, 3],
+        [tf.convert_to_tensor([42, 43]),
+         tf.convert_to_tensor([[1., 2.], [3., 4.]])])
+    self.assertAllEqual([0, 42, 43], agg1.read([0, 1, 3]))
+    self.assertAllEqual([[0., 0.], [1., 2.], [3., 4.]], agg2.read([0, 1, 3]))
+    with self.assertRaises(tf.errors.InvalidArgumentError):
+      utils.Aggregator.replace_many(
+          [agg1, agg2], [1, 1],
+          [tf.convert_to_tensor([42, 43]),
+           tf.convert_to_tensor([[1., 2.], [3., 4.]])])
+
+
+class InferenceHeaderTest(tf.test.TestCase):
+
+  def test_roundtrip(self):
+    header = np.zeros(2, utils.INFERENCE_HEADER_DTYPE)
+    header['env_id'] = [3, 7]
+    header['run_id'] = [np.iinfo(np.int64).max, 5]
+    header['reward'] = [1.5, -2.]
+    header['raw_reward'] = [0.25, 4.]
+    header['episode_step'] = [10, 0]
+    header['done'] = [False, True]
+    header['abandoned'] = [True, False]
+
+    fields = utils.unpack_inference_header(
+        tf.constant(utils.inference_header_bytes(header)))
+    for name in utils.INFERENCE_HEADER_DTYPE.names:
+      self.assertEqual(fields[name].dtype, header[name].dtype)
+      self.assertAllEqual(fields[name], header[name])
+
 
 class BatchApplyTest(tf.test.TestCase):
 
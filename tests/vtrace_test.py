@@ -33,9 +33,10 @@ def _shaped_arange(*shape):
   return np.arange(np.prod(shape), dtype=np.float32).reshape(*shape)
 
 
-def _softmax(logits):
-  """Applies softmax non-linearity on inputs."""
-  return np.exp(logits) / np.sum(np.exp(logits), axis=-1, keepdims=True)
+def _log_softmax(logits):
+  """Applies log-softmax on inputs, computed stably via logsumexp."""
+  shifted = logits - np.max(logits, axis=-1, keepdims=True)
+  return shifted - np.log(np.sum(np.exp(shifted), axis=-1, keepdims=True))
 
 
 def _ground_truth_calculation(discounts, behaviour_action_log_probs,
@@ -44,7 +45,6 @@ def _ground_truth_calculation(discounts, behaviour_action_log_probs,
                               clip_pg_rho_threshold):
   """Calculates the ground truth for V-trace in Python/Numpy."""
   log_rhos = target_action_log_probs - behaviour_action_log_probs
-  vs = []
   seq_len = len(discounts)
   rhos = np.exp(log_rhos)
   cs = np.minimum(rhos, 1.0)
@@ -55,29 +55,25 @@ def _ground_truth_calculation(discounts, behaviour_action_log_probs,
   if clip_pg_rho_threshold:
     clipped_pg_rhos = np.minimum(rhos, clip_pg_rho_threshold)
 
-  # This is a very inefficient way to calculate the V-trace ground truth.
-  # We calculate it this way because it is close to the mathematical notation of
-  # V-trace.
-  # v_s = V(x_s)
-  #       + \sum^{T-1}_{t=s} \gamma^{t-s}
-  #         * \prod_{i=s}^{t-1} c_i
-  #         * \rho_t (r_t + \gamma V(x_{t+1}) - V(x_t))
-  # Note that when we take the product over c_i, we write `s:t` as the notation
-  # of the paper is inclusive of the `t-1`, but Python is exclusive.
-  # Also note that np.prod([]) == 1.
-  values_t_plus_1 = np.concatenate([values, bootstrap_value[None, :]], axis=0)
-  for s in range(seq_len):
-    v_s = np.copy(values[s])  # Very important copy.
-    for t in range(s, seq_len):
-      v_s += (
-          np.prod(discounts[s:t], axis=0) * np.prod(cs[s:t],
-                                                    axis=0) * clipped_rhos[t] *
-          (rewards[t] + discounts[t] * values_t_plus_1[t + 1] - values[t]))
-    vs.append(v_s)
-  vs = np.stack(vs, axis=0)
+  # We calculate v_s with the backward recursion of V-trace:
+  # v_s - V(x_s) = \delta_s V + \gamma_s c_s (v_{s+1} - V(x_{s+1}))
+  # with \delta_s V = \rho_s (r_s + \gamma_s V(x_{s+1}) - V(x_s)).
+  # Both buffers hold seq_len + 1 rows, ending with the bootstrap value, so
+  # that the values at t and t + 1 are two views of the same buffer.
+  values_t_plus_1 = np.empty((seq_len + 1,) + values.shape[1:], values.dtype)
+  values_t_plus_1[:seq_len] = values
+  values_t_plus_1[seq_len] = bootstrap_value
+  vs_t_plus_1 = np.empty_like(values_t_plus_1)
+  vs_t_plus_1[seq_len] = bootstrap_value
+  acc = np.zeros_like(bootstrap_value)
+  for s in reversed(range(seq_len)):
+    delta_s = clipped_rhos[s] * (
+        rewards[s] + discounts[s] * values_t_plus_1[s + 1] - values[s])
+    acc = delta_s + discounts[s] * cs[s] * acc
+    vs_t_plus_1[s] = values[s] + acc
+  vs = vs_t_plus_1[:seq_len]
   pg_advantages = (
-      clipped_pg_rhos * (rewards + discounts * np.concatenate(
-          [vs[1:], bootstrap_value[None, :]], axis=0) - values))
+      clipped_pg_rhos * (rewards + discounts * vs_t_plus_1[1:] - values))
 
   return vtrace.VTraceReturns(vs=vs, pg_advantages=pg_advantages)
 
@@ -85,18 +81,25 @@ def _ground_truth_calculation(discounts, behaviour_action_log_probs,
 class LogProbsFromLogitsAndActionsTest(tf.test.TestCase,
                                        parameterized.TestCase):
 
+  @classmethod
+  def setUpClass(cls):
+    super(LogProbsFromLogitsAndActionsTest, cls).setUpClass()
+    # Shared by all test cases.
+    cls._num_actions = 3
+    cls._categorical_distribution = CategoricalDistribution(
+        cls._num_actions, 'int32')
+
   def test_log_probs_from_logits_and_actions(self):
     """Tests log_probs_from_logits_and_actions."""
     batch_size = 2
     seq_len = 7
-    num_actions = 3
+    num_actions = self._num_actions
 
     policy_logits = _shaped_arange(seq_len, batch_size, num_actions) + 10
     actions = np.random.randint(
         0, num_actions - 1, size=(seq_len, batch_size), dtype=np.int32)
 
-    categorical_distribution = CategoricalDistribution(num_actions, 'int32')
-    action_log_probs_tensor = categorical_distribution.log_prob(
+    action_log_probs_tensor = self._categorical_distribution.log_prob(
         policy_logits, actions)
 
     # Ground Truth
@@ -106,10 +109,8 @@ class LogProbsFromLogitsAndActionsTest(tf.test.TestCase,
     def index_with_mask(array, mask):
       return array[mask].reshape(*array.shape[:-1])
 
-    # Note: Normally log(softmax) is not a good idea because it's not
-    # numerically stable. However, in this test we have well-behaved values.
     ground_truth_v = index_with_mask(
-        np.log(_softmax(policy_logits)), action_index_mask)
+        _log_softmax(policy_logits), action_index_mask)
 
     self.assertAllClose(ground_truth_v, action_log_probs_tensor)
 
@@ -143,6 +144,13 @@ class VtraceTest(tf.test.TestCase, parameterized.TestCase):
     ground_truth_v = _ground_truth_calculation(**values)
     self.assertAllClose(output, ground_truth_v)
 
+    log_rhos_values = dict(values)
+    del log_rhos_values['behaviour_action_log_probs']
+    log_rhos_values['log_rhos'] = log_rhos_values.pop(
+        'target_action_log_probs')
+    self.assertAllClose(vtrace.from_log_rhos(**log_rhos_values),
+                        ground_truth_v)
+
 
 if __name__ == '__main__':
   tf.test.main()